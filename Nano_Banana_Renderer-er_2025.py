@@ -55,11 +55,26 @@ Tested: macOS Rhino 8 with CPython
 import os
 import sys
 import io
-import base64
+import binascii
+import bisect
+import functools
+import hashlib
 import mimetypes
+import mmap
 import json
+import math
+import re
+import tempfile
 import time
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple, OrderedDict
+
+try:
+    import orjson  # Optional: faster settings serialization
+except ImportError:
+    orjson = None
 
 # Rhino / .NET (pythonnet)
 import Rhino
@@ -70,23 +85,129 @@ import Eto.Forms as Forms
 from Eto.Forms import TextAlignment
 import Eto.Drawing as Drawing
 import System
+from System.IO import MemoryStream
 import System.Drawing as SD
 import System.Drawing.Imaging as Imaging
+import System.Drawing.Drawing2D as Drawing2D
 
 # Settings file path
 SETTINGS_FILE = Path.home() / "Documents" / "RhinoGeminiSettings.json"
 
+# Longest edge (px) of viewport captures sent to Gemini
+MAX_UPLOAD_EDGE = 1024
+
+# Age (s) after which a Files API upload is redone. The API deletes uploads after 48 hours,
+# and this leaves room for a batch job (up to 24 hours) that still references the file
+UPLOAD_TTL = 12 * 3600
+
+# User/model exchanges from Prompt_history kept and resent with each iteration
+MAX_HISTORY_TURNS = 4
+
+# Variants submitted together as one Batch API job, billed at BATCH_PRICE_FACTOR
+BATCH_VARIANTS = 4
+BATCH_PRICE_FACTOR = 0.5
+# Longest wait (s) between batch job status polls
+BATCH_POLL_MAX = 30.0
+_BATCH_DONE_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+# Reused preview file for Eto builds that cannot decode from a stream
+PREVIEW_TEMP_PATH = Path(tempfile.gettempdir()) / "nano_vp_preview.png"
+
+# Mood board geometry: 4 columns of 16:9 previews across the ~580 px Render tab
+MOOD_COL_GAP = 10
+MOOD_CONTENT_WIDTH = 580
+MOOD_COL_WIDTH = int((MOOD_CONTENT_WIDTH - 3 * MOOD_COL_GAP) / 4)
+MOOD_IMG_HEIGHT = int(round(MOOD_COL_WIDTH * 9.0 / 16.0))
+MOOD_BTN_WIDTH = int((MOOD_COL_WIDTH - 6) / 2)  # two buttons, 6 px apart
+
+# Model pricing configuration (per 1M tokens in USD)
+# Source: https://ai.google.dev/gemini-api/docs/pricing (September 2025)
+# Gemini 2.5 Flash Image blog: https://developers.googleblog.com/en/introducing-gemini-2-5-flash-image/
+MODEL_PRICING = {
+    "gemini-2.5-flash-image-preview": {
+        "input_price": 0.30,  # $0.30 per 1M tokens (text/image/video)
+        "output_price": 2.50,  # $2.50 per 1M tokens (including thinking tokens)
+        "image_generation_price": 30.00,  # $30.00 per 1M output tokens for images
+        "tokens_per_image": 1290,  # Each generated image consumes 1290 tokens
+        "cost_per_image": 0.039  # $0.039 per image (1290 * $30/1M)
+    },
+    "gemini-2.0-flash": {
+        "input_price": 0.10,  # $0.10 per 1M tokens (text/image/video)
+        "output_price": 0.40,  # $0.40 per 1M tokens
+        "image_generation_price": 30.00,  # $30.00 per 1M output tokens for images
+        "tokens_per_image": 1290,  # Each generated image consumes 1290 tokens
+        "cost_per_image": 0.039  # $0.039 per image (1290 * $30/1M)
+    }
+}
+DEFAULT_MODEL = "gemini-2.5-flash-image-preview"
 
-def load_settings():
-    """Load settings from JSON file."""
+# Per-token prices precomputed from MODEL_PRICING: (input, output, per image)
+_PRICING = {
+    model: (p["input_price"] / 1_000_000, p["output_price"] / 1_000_000, p["cost_per_image"])
+    for model, p in MODEL_PRICING.items()
+}
+
+GenerationCost = namedtuple("GenerationCost", ["input_cost", "output_cost", "image_cost", "total_cost"])
+
+# google-genai is slow to import, so it is loaded on first use (see _get_genai)
+_genai = None
+_genai_types = None
+_genai_import_error = None
+# Attribute names the installed SDK uses for Part.inline_data / Blob.mime_type
+_INLINE_ATTR = "inline_data"
+_MIME_ATTR = "mime_type"
+
+
+def _model_fields(cls):
+    """Return the field names of a pydantic model class (v1 or v2)."""
+    return getattr(cls, "model_fields", None) or getattr(cls, "__fields__", None) or {}
+
+
+def _get_genai():
+    """Import google-genai once and return (genai, types). Raises ImportError if missing.
+
+    A failed import is remembered, so later calls fail fast instead of
+    searching sys.path again.
+    """
+    global _genai, _genai_types, _genai_import_error, _INLINE_ATTR, _MIME_ATTR
+    if _genai is None:
+        if _genai_import_error is not None:
+            raise _genai_import_error
+        try:
+            from google import genai
+            from google.genai import types
+        except ImportError as e:
+            _genai_import_error = e
+            raise
+        part_fields = _model_fields(types.Part)
+        if part_fields and "inline_data" not in part_fields:
+            _INLINE_ATTR = "inlineData"
+        blob_fields = _model_fields(types.Blob)
+        if blob_fields and "mime_type" not in blob_fields:
+            _MIME_ATTR = "mimeType"
+        _genai_types = types
+        _genai = genai
+    return _genai, _genai_types
+
+
+def read_settings_file():
+    """Read settings from JSON file. Returns None if the file is missing or unreadable."""
     try:
         if SETTINGS_FILE.exists():
             with open(SETTINGS_FILE, 'r') as f:
                 return json.load(f)
     except Exception as e:
         print(f"Failed to load settings: {e}")
-    
-    # Default settings
+    return None
+
+
+def load_settings():
+    """Load settings from JSON file."""
+    return read_settings_file() or default_settings()
+
+
+def default_settings():
+    """Default settings used until (or instead of) the settings file."""
     return {
         "api_key": "",
         "output_folder": str(get_default_save_dir()),
@@ -96,153 +217,328 @@ def load_settings():
     }
 
 
+# Hash of the last settings written, so unchanged settings aren't rewritten
+_last_saved_settings_hash = None
+
+
 def save_settings(settings):
-    """Save settings to JSON file."""
+    """Save settings to JSON file (skipped if nothing changed since the last save)."""
+    global _last_saved_settings_hash
+    try:
+        settings_hash = hash(tuple(sorted(settings.items())))
+    except TypeError:
+        settings_hash = None  # Unhashable values - always write
+    if settings_hash is not None and settings_hash == _last_saved_settings_hash:
+        return
+
     try:
         SETTINGS_FILE.parent.mkdir(exist_ok=True)
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=2)
+        if orjson is not None:
+            SETTINGS_FILE.write_bytes(orjson.dumps(settings, option=orjson.OPT_INDENT_2))
+        else:
+            with open(SETTINGS_FILE, 'w') as f:
+                json.dump(settings, f, indent=2)
+        _last_saved_settings_hash = settings_hash
     except Exception as e:
         print(f"Failed to save settings: {e}")
 
 
+# GDI+ encoders, looked up once per MIME type
+_IMAGE_ENCODERS = {}
+# EncoderParameters, built once per (encoder, value)
+_ENCODER_PARAMS = {}
+
+
+def _get_image_encoder(mime_type):
+    """Return the GDI+ ImageCodecInfo for a MIME type (cached)."""
+    if mime_type not in _IMAGE_ENCODERS:
+        _IMAGE_ENCODERS[mime_type] = None
+        for codec in Imaging.ImageCodecInfo.GetImageEncoders():
+            if codec.MimeType == mime_type:
+                _IMAGE_ENCODERS[mime_type] = codec
+                break
+    return _IMAGE_ENCODERS[mime_type]
+
+
+def _get_encoder_params(encoder, value):
+    """Return a single-entry EncoderParameters for encoder=value (cached)."""
+    key = (str(encoder.Guid), value)
+    params = _ENCODER_PARAMS.get(key)
+    if params is None:
+        params = Imaging.EncoderParameters(1)
+        params.Param[0] = Imaging.EncoderParameter(encoder, System.Int64(value))
+        _ENCODER_PARAMS[key] = params
+    return params
+
+
+def _encode_bitmap(bmp, mime_type, fallback_format, encoder, value):
+    """Encode .NET Bitmap into a MemoryStream using a single encoder parameter."""
+    ms = MemoryStream()
+    try:
+        bmp.Save(ms, _get_image_encoder(mime_type), _get_encoder_params(encoder, value))
+    except Exception:
+        # Codec missing or parameter rejected - use encoder defaults
+        ms.SetLength(0)
+        bmp.Save(ms, fallback_format)
+    return ms
+
+
+def _stream_to_bytes(ms):
+    """Convert a .NET MemoryStream to Python bytes with a single copy."""
+    try:
+        # GetBuffer() exposes the backing byte[] without ToArray()'s copy;
+        # slice to Length since the buffer is usually over-allocated
+        return bytes(memoryview(ms.GetBuffer())[:int(ms.Length)])
+    except Exception:
+        # Runtime without buffer protocol support for .NET arrays; bytes()
+        # iterates the array directly, no intermediate bytearray
+        return bytes(ms.ToArray())
+
+
 def bitmap_to_png_bytes(bmp):
-    """Convert .NET Bitmap to Python bytes (PNG format)."""
+    """Convert .NET Bitmap to Python bytes (PNG format, fastest compression)."""
     try:
-        ms = System.IO.MemoryStream()
-        bmp.Save(ms, Imaging.ImageFormat.Png)
-        # Convert .NET byte[] to Python bytes
-        data = ms.ToArray()
-        return bytes(bytearray(data))
+        ms = _encode_bitmap(bmp, "image/png", Imaging.ImageFormat.Png, Imaging.Encoder.Compression, 1)
+        return _stream_to_bytes(ms)
     except Exception as e:
         raise RuntimeError(f"Failed to convert bitmap to PNG bytes: {e}")
 
 
-def read_file_as_part(path):
-    """Read file as bytes with MIME type for Gemini API."""
-    from google.genai import types
-    
-    if not path:
-        return None
-    
-    path_obj = Path(path)
-    if not path_obj.is_file():
-        return None
-    
-    mime_type, _ = mimetypes.guess_type(str(path_obj))
-    if mime_type is None:
-        mime_type = "application/octet-stream"
-    
+def bitmap_to_jpeg_bytes(bmp, quality=90):
+    """Convert .NET Bitmap to Python bytes (JPEG format)."""
     try:
-        with open(path_obj, "rb") as f:
-            data = f.read()
-        return types.Part.from_bytes(data=data, mime_type=mime_type)
+        ms = _encode_bitmap(bmp, "image/jpeg", Imaging.ImageFormat.Jpeg, Imaging.Encoder.Quality, quality)
+        return _stream_to_bytes(ms)
     except Exception as e:
-        print(f"Warning: Failed to read file {path}: {e}")
-        return None
+        raise RuntimeError(f"Failed to convert bitmap to JPEG bytes: {e}")
+
+
+def resize_bitmap(bmp, width, height):
+    """Return a high-quality resized copy of a .NET Bitmap."""
+    resized = SD.Bitmap(int(width), int(height))
+    graphics = SD.Graphics.FromImage(resized)
+    try:
+        graphics.InterpolationMode = Drawing2D.InterpolationMode.HighQualityBicubic
+        graphics.DrawImage(bmp, 0, 0, int(width), int(height))
+    finally:
+        graphics.Dispose()
+    return resized
+
+
+def fit_bitmap(bmp, max_width, max_height):
+    """Downscale a .NET Bitmap to fit max_width x max_height, keeping aspect ratio.
+
+    Returns bmp itself when it already fits.
+    """
+    scale = min(max_width / bmp.Width, max_height / bmp.Height)
+    if scale >= 1.0:
+        return bmp
+    return resize_bitmap(bmp, max(1, round(bmp.Width * scale)), max(1, round(bmp.Height * scale)))
+
+
+def bitmap_to_upload_bytes(bmp, jpeg_for_upload=True):
+    """Encode .NET Bitmap for sending to Gemini. Returns (bytes, mime_type).
+
+    JPEG is much smaller and faster to encode than PNG; PNG is only needed
+    for images saved to disk.
+    """
+    if jpeg_for_upload:
+        return bitmap_to_jpeg_bytes(bmp), "image/jpeg"
+    return bitmap_to_png_bytes(bmp), "image/png"
+
+
+def guess_mime_type(path):
+    """Return the MIME type for a file path, defaulting to application/octet-stream."""
+    mime_type, _ = mimetypes.guess_type(str(path))
+    return mime_type or "application/octet-stream"
+
+
+def read_file_bytes(path):
+    """Read a whole file, copying straight out of the page cache via mmap."""
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            return f.read()
+        try:
+            return bytes(mm)
+        finally:
+            mm.close()
+
+
+# Recently read files keyed by (path, mtime_ns, size), least recently used first
+_FILE_CACHE_SIZE = 32
+_file_cache = OrderedDict()
+# Mood board preview thumbnails each form keeps for reselected files
+_REF_CACHE_SIZE = 8
+
+
+def read_file_cached(path, st=None):
+    """Return a file's bytes, served from memory while its mtime and size are unchanged."""
+    if st is None:
+        st = os.stat(path)
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    data = _file_cache.get(key)
+    if data is None:
+        data = read_file_bytes(path)
+        _file_cache[key] = data
+        if len(_file_cache) > _FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+    else:
+        _file_cache.move_to_end(key)
+    return data
+
+
+def trim_history(history, max_turns=MAX_HISTORY_TURNS):
+    """Drop all but the last max_turns exchanges from a Prompt history, in place.
+
+    The kept window always starts on a user turn, as the API expects.
+    """
+    start = max(len(history) - 2 * max_turns, 0)
+    while start < len(history) - 1 and getattr(history[start], "role", "user") != "user":
+        start += 1
+    if start:
+        del history[:start]
+
+
+# Prefix of a base64 data URI returned as text in place of inline image data
+_DATA_URI_RE = re.compile(r"data:(image/[\w.+-]+);base64,")
+
+
+# Lens types by 35mm focal length: < 24mm ultra-wide, < 35mm wide, ...
+_LENS_BOUNDS = (24, 35, 85, 135)
+_LENS_NAMES = ('ultra-wide angle', 'wide angle', 'normal', 'short telephoto', 'telephoto')
+
+
+def classify_lens(lens_length):
+    """Return the lens type name for a 35mm-equivalent focal length."""
+    return _LENS_NAMES[bisect.bisect_right(_LENS_BOUNDS, lens_length)]
+
+
+@functools.lru_cache(maxsize=8)
+def camera_prompt_text(camera_type, lens_length, lens_type, field_of_view):
+    """Build the camera sentence added to AI prompts (memoized; cameras repeat)."""
+    camera_desc = []
+    
+    if camera_type == 'perspective':
+        camera_desc.append(f"Shot with a {lens_length} {lens_type}")
+        if field_of_view:
+            camera_desc.append(f"field of view {field_of_view}")
+    elif camera_type == 'parallel':
+        camera_desc.append("Shot with orthographic projection (no perspective distortion)")
+    
+    if camera_desc:
+        return f"Camera settings: {', '.join(camera_desc)}. "
+    return ""
+
+
+def _probe(sources, name):
+    """Return the first non-None attribute `name` among sources."""
+    for obj in sources:
+        value = getattr(obj, name, None)
+        if value is not None:
+            return value
+    return None
 
 
 def extract_camera_info(viewport):
     """Extract camera information from Rhino viewport."""
+    unknown = {
+        'type': 'unknown',
+        'lens_length': 'unknown',
+        'lens_type': 'unknown',
+        'field_of_view': 'unknown'
+    }
     try:
-        camera_info = {}
-        
-        # Try to get viewport info
-        vp_info = None
-        if hasattr(viewport, 'ViewportInfo'):
-            vp_info = viewport.ViewportInfo
-        elif hasattr(viewport, 'GetViewportInfo'):
+        # Try viewport info first, then the viewport itself
+        vp_info = getattr(viewport, 'ViewportInfo', None)
+        if vp_info is None and hasattr(viewport, 'GetViewportInfo'):
             vp_info = viewport.GetViewportInfo()
-        
-        # If we couldn't get viewport info, try direct access to viewport properties
-        if vp_info is None:
-            # Try direct access to viewport properties
-            try:
-                if hasattr(viewport, 'IsPerspectiveProjection'):
-                    camera_info['type'] = 'perspective' if viewport.IsPerspectiveProjection else 'parallel'
-                
-                if hasattr(viewport, 'Camera35mmLensLength'):
-                    lens_length = viewport.Camera35mmLensLength
-                    camera_info['lens_length'] = f"{lens_length:.1f}mm"
-                    
-                    # Categorize lens type
-                    if lens_length < 24:
-                        camera_info['lens_type'] = 'ultra-wide angle'
-                    elif lens_length < 35:
-                        camera_info['lens_type'] = 'wide angle'
-                    elif lens_length < 85:
-                        camera_info['lens_type'] = 'normal'
-                    elif lens_length < 135:
-                        camera_info['lens_type'] = 'short telephoto'
-                    else:
-                        camera_info['lens_type'] = 'telephoto'
-                
-                if hasattr(viewport, 'CameraAngle'):
-                    fov_radians = viewport.CameraAngle
-                    fov_degrees = fov_radians * 180.0 / 3.14159
-                    camera_info['field_of_view'] = f"{fov_degrees:.1f}°"
-                
-                # Return what we found
-                if camera_info:
-                    return camera_info
-                    
-            except Exception:
-                pass
-            
-            # Last resort fallback
+        sources = [obj for obj in (vp_info, viewport) if obj is not None]
+
+        is_perspective = _probe(sources, 'IsPerspectiveProjection')
+        lens_length = _probe(sources, 'Camera35mmLensLength')
+        fov_radians = _probe(sources, 'CameraAngle')
+        if is_perspective is None and lens_length is None and fov_radians is None:
+            return unknown
+
+        camera_info = {}
+        if is_perspective is None:
             camera_info['type'] = 'unknown'
-            camera_info['lens_length'] = 'unknown'
-            camera_info['lens_type'] = 'unknown'
-            camera_info['field_of_view'] = 'unknown'
-            return camera_info
-        
-        # Camera type
-        if hasattr(vp_info, 'IsPerspectiveProjection') and vp_info.IsPerspectiveProjection:
-            camera_info['type'] = 'perspective'
-        elif hasattr(vp_info, 'IsParallelProjection') and vp_info.IsParallelProjection:
-            camera_info['type'] = 'parallel'
         else:
-            camera_info['type'] = 'unknown'
-        
+            camera_info['type'] = 'perspective' if is_perspective else 'parallel'
+
         # Lens length (focal length) - only meaningful for perspective views
-        if camera_info['type'] == 'perspective' and hasattr(vp_info, 'Camera35mmLensLength'):
-            lens_length = vp_info.Camera35mmLensLength
+        if camera_info['type'] == 'perspective' and lens_length is not None:
             camera_info['lens_length'] = f"{lens_length:.1f}mm"
-            
             # Categorize lens type for better AI understanding
-            if lens_length < 24:
-                camera_info['lens_type'] = 'ultra-wide angle'
-            elif lens_length < 35:
-                camera_info['lens_type'] = 'wide angle'
-            elif lens_length < 85:
-                camera_info['lens_type'] = 'normal'
-            elif lens_length < 135:
-                camera_info['lens_type'] = 'short telephoto'
-            else:
-                camera_info['lens_type'] = 'telephoto'
+            camera_info['lens_type'] = classify_lens(lens_length)
         else:
             camera_info['lens_length'] = 'N/A (parallel projection)'
             camera_info['lens_type'] = 'orthographic'
-        
-        # Field of view
-        if hasattr(vp_info, 'CameraAngle'):
-            fov_radians = vp_info.CameraAngle
-            fov_degrees = fov_radians * 180.0 / 3.14159
-            camera_info['field_of_view'] = f"{fov_degrees:.1f}°"
-        
+
+        if fov_radians is not None:
+            camera_info['field_of_view'] = f"{math.degrees(fov_radians):.1f}°"
+
         return camera_info
-        
+
+    except Exception:
+        return unknown
+
+
+class HideCurvesConduit(rdisplay.DisplayConduit):
+    """Display conduit that culls curve objects from drawing while enabled."""
+
+    def ObjectCulling(self, e):
+        if e.RhinoObject.ObjectType == Rhino.DocObjects.ObjectType.Curve:
+            e.CullObject = True
+
+
+def find_curve_ids():
+    """Return ids of all curve objects in the document."""
+    return [obj.Id for obj in sc.doc.Objects if obj.ObjectType == Rhino.DocObjects.ObjectType.Curve]
+
+
+def _hide_curve_objects():
+    """Hide curve objects in a single undo record. Returns [(id, was_visible)]."""
+    orig_curves_visible = []
+    undo_id = sc.doc.BeginUndoRecord("Hide curves for capture")
+    try:
+        for obj_id in find_curve_ids():
+            obj = sc.doc.Objects.FindId(obj_id)
+            if obj is None:
+                continue
+            was_visible = obj.Attributes.Visible
+            orig_curves_visible.append((obj_id, was_visible))
+            if was_visible:
+                obj.Attributes.Visible = False
+                obj.CommitChanges()
     except Exception as e:
-        return {
-            'type': 'unknown',
-            'lens_length': 'unknown',
-            'lens_type': 'unknown',
-            'field_of_view': 'unknown'
-        }
+        print(f"Warning: Could not hide curves: {e}")
+    finally:
+        sc.doc.EndUndoRecord(undo_id)
+    return orig_curves_visible
 
 
-def capture_active_view_shaded(width=None, height=None):
-    """Capture active viewport as PNG bytes, temporarily set to Shaded mode with clean background. Returns bitmap, PNG bytes, and camera info."""
+def _restore_curve_objects(orig_curves_visible):
+    """Restore curve visibility saved by _hide_curve_objects in a single undo record."""
+    if not orig_curves_visible:
+        return
+    undo_id = sc.doc.BeginUndoRecord("Restore curves after capture")
+    try:
+        for obj_id, was_visible in orig_curves_visible:
+            obj = sc.doc.Objects.FindId(obj_id)
+            if obj and obj.Attributes.Visible != was_visible:
+                obj.Attributes.Visible = was_visible
+                obj.CommitChanges()
+    except Exception as e:
+        print(f"Warning: Could not restore curve visibility: {e}")
+    finally:
+        sc.doc.EndUndoRecord(undo_id)
+
+
+def capture_active_view_shaded(width=None, height=None, jpeg_for_upload=True):
+    """Capture active viewport as image bytes, temporarily set to Shaded mode with clean background. Returns bitmap, image bytes, MIME type, and camera info."""
     view = sc.doc.Views.ActiveView
     if view is None:
         raise RuntimeError("No active view to capture.")
@@ -258,19 +554,16 @@ def capture_active_view_shaded(width=None, height=None):
     if shaded_dm is None:
         raise RuntimeError("Couldn't find 'Shaded' display mode.")
 
-    # Store original curve display settings
+    # Hide curves with a display conduit so the document isn't modified;
+    # fall back to toggling object visibility if the conduit can't be used
+    curves_conduit = None
     orig_curves_visible = []
     try:
-        # Temporarily hide all curve objects
-        for obj in sc.doc.Objects:
-            if obj.ObjectType == Rhino.DocObjects.ObjectType.Curve:
-                was_visible = obj.Attributes.Visible
-                orig_curves_visible.append((obj.Id, was_visible))
-                if was_visible:
-                    obj.Attributes.Visible = False
-                    obj.CommitChanges()
-    except Exception as e:
-        print(f"Warning: Could not hide curves: {e}")
+        curves_conduit = HideCurvesConduit()
+        curves_conduit.Enabled = True
+    except Exception:
+        curves_conduit = None
+        orig_curves_visible = _hide_curve_objects()
 
     try:
         # Switch to Shaded mode
@@ -310,18 +603,21 @@ def capture_active_view_shaded(width=None, height=None):
         if bmp is None:
             raise RuntimeError("Capture returned None.")
         
-        return bmp, bitmap_to_png_bytes(bmp), camera_info
+        # Downscale once to the size Gemini works at and release the
+        # full-resolution capture right away
+        send_bmp = fit_bitmap(bmp, MAX_UPLOAD_EDGE, MAX_UPLOAD_EDGE)
+        if send_bmp is not bmp:
+            bmp.Dispose()
+        
+        image_bytes, image_mime = bitmap_to_upload_bytes(send_bmp, jpeg_for_upload)
+        return send_bmp, image_bytes, image_mime, camera_info
         
     finally:
         # Restore curve visibility
-        try:
-            for obj_id, was_visible in orig_curves_visible:
-                obj = sc.doc.Objects.FindId(obj_id)
-                if obj and obj.Attributes.Visible != was_visible:
-                    obj.Attributes.Visible = was_visible
-                    obj.CommitChanges()
-        except Exception as e:
-            print(f"Warning: Could not restore curve visibility: {e}")
+        if curves_conduit is not None:
+            curves_conduit.Enabled = False
+        else:
+            _restore_curve_objects(orig_curves_visible)
         
         # Restore original display mode
         try:
@@ -331,20 +627,38 @@ def capture_active_view_shaded(width=None, height=None):
             print(f"Warning: Failed to restore original display mode: {e}")
 
 
+# (document path, directory) from the last get_default_save_dir call
+_default_save_dir_cache = (None, None)
+
+
 def get_default_save_dir():
-    """Get default directory to save result images."""
-    if sc.doc.Path and Path(sc.doc.Path).parent.exists():
-        return str(Path(sc.doc.Path).parent)
+    """Get default directory to save result images (cached until the document path changes)."""
+    global _default_save_dir_cache
+    doc_path = sc.doc.Path
+    cached_doc_path, cached_dir = _default_save_dir_cache
+    if cached_dir is not None and cached_doc_path == doc_path:
+        return cached_dir
     
-    # Fallback to Pictures directory
-    pictures_dir = Path.home() / "Pictures"
-    pictures_dir.mkdir(exist_ok=True)
-    return str(pictures_dir)
+    if doc_path and Path(doc_path).parent.exists():
+        save_dir = str(Path(doc_path).parent)
+    else:
+        # Fallback to Pictures directory
+        pictures_dir = Path.home() / "Pictures"
+        pictures_dir.mkdir(exist_ok=True)
+        save_dir = str(pictures_dir)
+    
+    _default_save_dir_cache = (doc_path, save_dir)
+    return save_dir
 
 
 class NanoBananaChatForm(Forms.Form):
     """Chat-like UI form for iterative Gemini viewport integration."""
     
+    # Fixed prompt text; only the camera description / user prompt varies per request
+    _STRUCTURED_PROMPT_PREFIX = "Place what you see in the 3D viewport capture in a photo studio with a soft infinite white background. Always use the same soft daylight-like illumination. "
+    _STRUCTURED_PROMPT_SUFFIX = "Compare your result with the reference image and do not release it until the result is a complete match. Do not modify or change anything that doesn't match the viewport image in any way."
+    _STRICT_INSTRUCTION = "Follow the primary reference image strictly. Do not change the camera angle, form, or composition. "
+    
     def __init__(self):
         super().__init__()
         self.Title = "Nano 🍌 Viewport Renderer-er V2"
@@ -370,31 +684,12 @@ class NanoBananaChatForm(Forms.Form):
         except Exception:
             self.Icon = None
 
-        # Load settings
-        self.settings = load_settings()
-        
-        # Model pricing configuration (per 1M tokens in USD)
-        # Source: https://ai.google.dev/gemini-api/docs/pricing (September 2025)
-        # Gemini 2.5 Flash Image blog: https://developers.googleblog.com/en/introducing-gemini-2-5-flash-image/
-        self.model_pricing = {
-            "gemini-2.5-flash-image-preview": {
-                "input_price": 0.30,  # $0.30 per 1M tokens (text/image/video)
-                "output_price": 2.50,  # $2.50 per 1M tokens (including thinking tokens)
-                "image_generation_price": 30.00,  # $30.00 per 1M output tokens for images
-                "tokens_per_image": 1290,  # Each generated image consumes 1290 tokens
-                "cost_per_image": 0.039  # $0.039 per image (1290 * $30/1M)
-            },
-            "gemini-2.0-flash": {
-                "input_price": 0.10,  # $0.10 per 1M tokens (text/image/video)
-                "output_price": 0.40,  # $0.40 per 1M tokens
-                "image_generation_price": 30.00,  # $30.00 per 1M output tokens for images
-                "tokens_per_image": 1290,  # Each generated image consumes 1290 tokens
-                "cost_per_image": 0.039  # $0.039 per image (1290 * $30/1M)
-            }
-        }
+        # Start from defaults; the settings file is read in the background
+        # so opening the form isn't blocked on disk I/O
+        self.settings = default_settings()
         
         # Fixed model
-        self.model = "gemini-2.5-flash-image-preview"
+        self.model = DEFAULT_MODEL
         
         # Timer state
         self.render_start_time = None
@@ -403,45 +698,289 @@ class NanoBananaChatForm(Forms.Form):
         # Chat Prompt counter and memory
         self.Prompt_step = 0
         self.Prompt_history = []  # Stores Prompt context for iterations
+        self._history_version = 0  # bumped whenever Prompt_history is replaced
+        self._image_parts = {}  # sha256 of image bytes -> shared inline Part
         
+        # Chat log / status bar updates are batched by a short UITimer
+        self._ui_thread_id = threading.get_ident()  # see _schedule_ui_flush
+        self._setup_ui_flush()
+        self._setup_settings_flush()
+
+        # (folder text, Path) of the last validated output folder
+        self._output_dir_cache = None
+
+        # Mood board controls are built exactly once, before any tab builder
+        # runs; everything else may assume self.ref_previews exists
+        self._build_reference_controls()
+
         # Initialize UI components
         self._setup_widgets()
         self._setup_layout()
         
         # State variables
         self._last_generated_image_path = None
+        self._last_generated_path_obj = None
+        self._last_generated_bytes = None  # image bytes as returned by the model
+        self._result_preview_src = None  # bytes the result_preview image was made from
+        self._output_writer = None
+        self._last_eto_bitmap = None  # viewer bitmap decoded from _last_eto_bitmap_path
+        self._last_eto_bitmap_path = None
         self._last_viewport_bitmap = None
         self._captured_viewport_bytes = None
+        self._captured_viewport_mime = "image/png"
+        # Part wrapping _captured_viewport_bytes, rebuilt when those bytes change
+        self._cached_viewport_part = None
+        self._cached_viewport_part_src = None
         self._camera_info = None
         self._viewport_captured = False
         self._first_capture = True  # Track if this is the first capture
+        self._in_flight = False  # True while a generate request is running
+        self._batch_in_flight = False  # True while a variants batch job is pending
+        self._batch_stop = threading.Event()  # Set on close to stop polling batch jobs
+        self._iterate_ready = False  # True once there is a generated image to iterate from
+        self._capture_in_flight = False  # True while a capture is being processed
         
         # Set initial prompt state - disabled until viewport captured
         self._update_prompt_state()
 
+        self.Closed += self._on_form_closed
+
+        # Mood board images uploaded through the Gemini Files API, as (file, upload time)
+        # keyed by (api_key, path, mtime, size) so unchanged files upload once per UPLOAD_TTL
+        self._uploaded_refs = {}
+        self._uploaded_lock = threading.Lock()  # guards _uploaded_refs against upload workers
+        # Worker pool for mood board uploads, created on first use
+        self._mood_pool = None
+        # Shared genai.Client, rebuilt only when the API key changes
+        self._genai_client = None
+        self._genai_client_key = None
+        # Panel-sized mood board thumbnails keyed by (path, mtime), least recently used first
+        self._ref_cache = OrderedDict()
+
+        # Read settings and warm up the google-genai import off the UI thread
+        threading.Thread(target=self._background_init, daemon=True).start()
+
+    def _background_init(self):
+        """Load settings file and import google-genai without blocking the UI."""
+        settings = read_settings_file()
+        if settings is not None:
+            Forms.Application.Instance.AsyncInvoke(lambda: self._apply_loaded_settings(settings))
+        try:
+            _get_genai()
+        except ImportError:
+            pass  # Reported to the user when a request is made
+
+    def _apply_loaded_settings(self, settings):
+        """Populate the form with settings read by _background_init (UI thread)."""
+        self.settings = settings
+        self.api_key_tb.Text = settings.get("api_key", "")
+        self.output_folder_tb.Text = settings.get("output_folder", get_default_save_dir())
+        self._update_status_bar()
+
+    def _on_form_closed(self, sender, e):
+        """Stop timers and release background resources when the form closes."""
+        self._ui_timer.Stop()
+        if self._flush_timer is not None:
+            self._flush_timer.Stop()
+        if self._mood_pool is not None:
+            self._mood_pool.shutdown(wait=False)
+        self._batch_stop.set()
+        # Write any usage totals still waiting on the settings timer
+        self._flush_settings_if_dirty()
+
+        # Remove uploaded mood board files without holding up the close
+        if self._uploaded_refs:
+            with self._uploaded_lock:
+                uploaded = list(self._uploaded_refs.items())
+                self._uploaded_refs = {}
+            threading.Thread(target=self._delete_uploaded_refs, args=(uploaded,), daemon=True).start()
+
+    def _make_image_part(self, data, mime_type):
+        """Return an inline image Part, shared by every turn that sends identical bytes.
+
+        Keeps Prompt_history from holding a separate copy of the same image
+        for each iteration.
+        """
+        key = (hashlib.sha256(data).digest(), mime_type)
+        part = self._image_parts.get(key)
+        if part is None:
+            _, types = _get_genai()
+            part = types.Part.from_bytes(data=data, mime_type=mime_type)
+            self._image_parts[key] = part
+        return part
+
+    def _prune_image_parts(self, history):
+        """Forget interned image Parts that the given Prompt history no longer references.
+
+        Keeps the Part table, and the image bytes it pins, bounded by the
+        history window rather than by the number of iterations.
+        """
+        live = {id(self._cached_viewport_part)}
+        for content in history:
+            live.update(id(part) for part in (getattr(content, "parts", None) or []))
+        self._image_parts = {key: part for key, part in self._image_parts.items() if id(part) in live}
+
+    def _viewport_part(self):
+        """Return the Primary Reference as a Part, reused until the captured bytes change."""
+        if self._cached_viewport_part_src is not self._captured_viewport_bytes:
+            self._cached_viewport_part = self._make_image_part(
+                self._captured_viewport_bytes, self._captured_viewport_mime
+            )
+            self._cached_viewport_part_src = self._captured_viewport_bytes
+        return self._cached_viewport_part
+
+    def _get_output_dir(self):
+        """Return the output folder as a Path, creating it on first use.
+
+        The result is cached per folder text, so repeat clicks skip the
+        exists/mkdir calls. Raises if the folder cannot be created.
+        """
+        text = self.output_folder_tb.Text
+        if self._output_dir_cache is not None and self._output_dir_cache[0] == text:
+            return self._output_dir_cache[1]
+        output_dir = Path(text)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self._output_dir_cache = (text, output_dir)
+        return output_dir
+
+    def _on_output_folder_changed(self, sender, e):
+        """Forget the validated output folder when the folder text changes."""
+        self._output_dir_cache = None
+
+    def _write_output_file(self, output_path, img_bytes):
+        """Write a generated image to disk (runs in background).
+
+        A missing output folder is re-created once. Any other failure is
+        logged and handed to _on_output_write_failed on the UI thread.
+        """
+        try:
+            try:
+                output_path.write_bytes(img_bytes)
+            except FileNotFoundError:
+                # The cached output folder was deleted after it was validated
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                output_path.write_bytes(img_bytes)
+        except Exception as e:
+            self._append_chat_log(f"Error: Could not save generated image {output_path}: {e}")
+            Forms.Application.Instance.AsyncInvoke(lambda: self._on_output_write_failed(output_path))
+
+    def _on_output_write_failed(self, output_path):
+        """Forget a generated image that never reached disk."""
+        self._output_dir_cache = None
+        if self._last_generated_path_obj == output_path:
+            self._last_generated_image_path = None
+            self._last_generated_path_obj = None
+            self.show_generated_btn.Enabled = False
+
+    def _wait_for_output_file(self):
+        """Block until the last generated image has been written to disk."""
+        if self._output_writer is not None:
+            self._output_writer.join()
+
+    def _client(self, api_key):
+        """Return the form's shared genai.Client for api_key."""
+        if self._genai_client is None or self._genai_client_key != api_key:
+            genai, _ = _get_genai()
+            self._genai_client = genai.Client(api_key=api_key)
+            self._genai_client_key = api_key
+        return self._genai_client
+
+    def _on_api_key_changed(self, sender, e):
+        """Drop the shared client so the next request uses the new key."""
+        self._genai_client = None
+
+    def _mood_board_refs(self):
+        """Snapshot the selected mood board images as (path, bytes, mime, stat) tuples.
+
+        Called on the UI thread when a request starts, so clearing or
+        replacing a slot afterwards cannot change or break that request.
+        """
+        return [
+            (p._file_path, p._cached_part_bytes, p._cached_mime, p._cached_stat)
+            for p in self.ref_previews
+            if getattr(p, '_cached_part_bytes', None) is not None
+        ]
+
+    def _mood_board_part(self, api_key, ref):
+        """Return a Part for a mood board image, uploading it via the Files API once per UPLOAD_TTL.
+
+        Uses the bytes read when the image was selected and falls back to
+        sending them inline if the upload fails.
+        """
+        _, types = _get_genai()
+        file_path, data, mime_type, stat = ref
+        try:
+            key = (api_key, file_path) + stat
+            with self._uploaded_lock:
+                entry = self._uploaded_refs.get(key)
+                if entry is not None and time.time() - entry[1] > UPLOAD_TTL:
+                    # Upload again well before the Files API deletes the old copy
+                    del self._uploaded_refs[key]
+                    entry = None
+            if entry is None:
+                uploaded = self._client(api_key).files.upload(file=io.BytesIO(data), config={"mime_type": mime_type})
+                entry = (uploaded, time.time())
+                # Of two overlapping requests only the first upload is kept
+                with self._uploaded_lock:
+                    kept = self._uploaded_refs.setdefault(key, entry)
+                if kept is not entry:
+                    threading.Thread(target=self._delete_uploaded_refs, args=([(key, entry)],), daemon=True).start()
+                    entry = kept
+            uploaded = entry[0]
+            return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+        except Exception as e:
+            print(f"Warning: Files API upload failed for {file_path}, sending inline: {e}")
+            return self._make_image_part(data, mime_type)
+
+    def _mood_board_parts(self, api_key, refs):
+        """Return Parts for the mood board refs from _mood_board_refs, uploading them concurrently.
+
+        Slots showing the same file share one upload.
+        """
+        keys = [(file_path,) + stat for file_path, _, _, stat in refs]
+        unique = {}
+        for key, ref in zip(keys, refs):
+            unique.setdefault(key, ref)
+        if len(unique) < 2:
+            parts = {key: self._mood_board_part(api_key, ref) for key, ref in unique.items()}
+        else:
+            if self._mood_pool is None:
+                self._mood_pool = ThreadPoolExecutor(max_workers=len(self.ref_previews))
+            parts = dict(zip(unique, self._mood_pool.map(lambda ref: self._mood_board_part(api_key, ref), unique.values())))
+        return [parts[key] for key in keys]
+
+    def _delete_uploaded_refs(self, uploaded):
+        """Delete mood board files uploaded via the Files API (runs in background)."""
+        try:
+            genai, _ = _get_genai()
+        except ImportError:
+            return
+        # Start from the shared client so its open connection is reused
+        clients = {}
+        if self._genai_client is not None:
+            clients[self._genai_client_key] = self._genai_client
+        for (api_key, file_path, _, _), (uploaded_file, _) in uploaded:
+            try:
+                if api_key not in clients:
+                    clients[api_key] = genai.Client(api_key=api_key)
+                clients[api_key].files.delete(name=uploaded_file.name)
+            except Exception as e:
+                print(f"Warning: Could not delete uploaded file {file_path}: {e}")
+
     def _get_model_pricing(self, model_name=None):
         """Get pricing information for specified model or current model."""
         model = model_name or self.model
-        return self.model_pricing.get(model, self.model_pricing["gemini-2.5-flash-image-preview"])
+        return MODEL_PRICING.get(model, MODEL_PRICING[DEFAULT_MODEL])
 
     def _calculate_generation_cost(self, input_tokens, output_tokens, model_name=None):
-        """Calculate total cost for a generation including image cost."""
-        pricing = self._get_model_pricing(model_name)
-        
-        # Standard token costs
-        input_cost = (input_tokens / 1_000_000) * pricing["input_price"]
-        output_cost = (output_tokens / 1_000_000) * pricing["output_price"] 
-        
-        # Fixed image generation cost
-        image_cost = pricing["cost_per_image"]
-        
-        return {
-            "input_cost": input_cost,
-            "output_cost": output_cost, 
-            "image_cost": image_cost,
-            "total_cost": input_cost + output_cost + image_cost,
-            "pricing_info": pricing
-        }
+        """Calculate total cost for a generation including image cost. Returns a GenerationCost."""
+        input_price, output_price, image_cost = _PRICING.get(model_name or self.model, _PRICING[DEFAULT_MODEL])
+        
+        # Standard token costs plus fixed image generation cost
+        input_cost = input_tokens * input_price
+        output_cost = output_tokens * output_price
+        
+        return GenerationCost(input_cost, output_cost, image_cost, input_cost + output_cost + image_cost)
 
     def _setup_widgets(self):
         """Initialize all UI widgets."""
@@ -449,6 +988,7 @@ class NanoBananaChatForm(Forms.Form):
         self.api_key_tb = Forms.PasswordBox()
         self.api_key_tb.Text = self.settings.get("api_key", "")
         self.api_key_tb.Size = Drawing.Size(425, -1)
+        self.api_key_tb.TextChanged += self._on_api_key_changed
         
         self.save_api_key_cb = Forms.CheckBox()
         self.save_api_key_cb.Text = "Save API Key"
@@ -457,6 +997,7 @@ class NanoBananaChatForm(Forms.Form):
         self.output_folder_tb = Forms.TextBox()
         self.output_folder_tb.Text = self.settings.get("output_folder", get_default_save_dir())
         self.output_folder_tb.ReadOnly = True
+        self.output_folder_tb.TextChanged += self._on_output_folder_changed
         self.output_folder_tb.Size = Drawing.Size(425, -1)
         
         self.browse_folder_btn = Forms.Button()
@@ -509,10 +1050,6 @@ Quick Guide:
         self.prompt_tb.GotFocus += on_prompt_focus
         self.prompt_tb.LostFocus += on_prompt_blur
 
-
-        # Reference image controls (up to 4) - MOOD BOARD
-        self._build_reference_controls()
-
         # Go Bananas checkbox
         self.go_bananas_cb = Forms.CheckBox()
         self.go_bananas_cb.Text = "Go Bananas!"
@@ -530,6 +1067,13 @@ Quick Guide:
         self.generate_btn.Enabled = False  # Disabled until viewport processed
         self.generate_btn.Click += self.on_generate
         
+        self.variants_btn = Forms.Button()
+        self.variants_btn.Text = f"Variants ×{BATCH_VARIANTS} 🎲"
+        self.variants_btn.Size = Drawing.Size(-1, 30)
+        self.variants_btn.Enabled = False
+        self.variants_btn.ToolTip = "Generate several variants as one Batch API job at half price (slower)"
+        self.variants_btn.Click += self.on_generate_batch
+        
         self.iterate_btn = Forms.Button()
         self.iterate_btn.Text = "Iterate 🔄"
         self.iterate_btn.Size = Drawing.Size(-1, 30)
@@ -582,33 +1126,30 @@ Quick Guide:
 
     def _setup_timer(self):
         """Setup timer update mechanism."""
-        try:
-            # Use threading timer instead of UITimer for better compatibility
-            import threading
-            self.timer_thread = None
-            self.timer_stop_event = None
-        except Exception as e:
-            print(f"Warning: Could not setup timer: {e}")
+        # UITimer ticks on the UI thread, so no worker thread or AsyncInvoke hop
+        self._ui_timer = Forms.UITimer()
+        self._ui_timer.Interval = 1.0
+        self._ui_timer.Elapsed += self._on_timer_tick
+
+    def _elapsed_timer_text(self):
+        """Format elapsed render time for the timer label."""
+        elapsed = time.time() - self.render_start_time
+        minutes = int(elapsed // 60)
+        seconds = int(elapsed % 60)
+        return f"Timer: {minutes:02d}:{seconds:02d}"
+
+    def _on_timer_tick(self, sender, e):
+        """UITimer tick handler - updates the timer label."""
+        if self.timer_running and self.render_start_time:
+            self.timer_label.Text = self._elapsed_timer_text()
 
     def _start_timer(self):
         """Start the render timer."""
         try:
-            import threading
             self.render_start_time = time.time()
             self.timer_running = True
             
-            # Stop any existing timer
-            if self.timer_thread and self.timer_thread.is_alive():
-                if self.timer_stop_event:
-                    self.timer_stop_event.set()
-                self.timer_thread.join(timeout=1.0)
-            
-            # Create new stop event and timer thread
-            self.timer_stop_event = threading.Event()
-            self.timer_thread = threading.Thread(target=self._timer_worker)
-            self.timer_thread.daemon = True
-            self.timer_thread.start()
-            
+            self._ui_timer.Start()
         except Exception as e:
             print(f"Warning: Could not start timer: {e}")
 
@@ -616,47 +1157,14 @@ Quick Guide:
         """Stop the render timer."""
         try:
             self.timer_running = False
-            if self.timer_stop_event:
-                self.timer_stop_event.set()
-            if self.timer_thread and self.timer_thread.is_alive():
-                self.timer_thread.join(timeout=1.0)
+            self._ui_timer.Stop()
             
             # Show final time in same format
             if self.render_start_time:
-                elapsed = time.time() - self.render_start_time
-                minutes = int(elapsed // 60)
-                seconds = int(elapsed % 60)
-                self.timer_label.Text = f"Timer: {minutes:02d}:{seconds:02d}"
+                self.timer_label.Text = self._elapsed_timer_text()
         except Exception as e:
             print(f"Warning: Could not stop timer: {e}")
 
-    def _timer_worker(self):
-        """Timer worker thread that updates the display."""
-        try:
-            while self.timer_running and not self.timer_stop_event.is_set():
-                if self.render_start_time:
-                    elapsed = time.time() - self.render_start_time
-                    minutes = int(elapsed // 60)
-                    seconds = int(elapsed % 60)
-                    timer_text = f"Timer: {minutes:02d}:{seconds:02d}"
-                    
-                    # Update UI on main thread
-                    try:
-                        # Use Application.Instance.AsyncInvoke for thread-safe UI updates
-                        if hasattr(Forms.Application, 'Instance') and Forms.Application.Instance:
-                            Forms.Application.Instance.AsyncInvoke(lambda: setattr(self.timer_label, 'Text', timer_text))
-                        else:
-                            # Fallback: direct assignment (may not be thread-safe)
-                            self.timer_label.Text = timer_text
-                    except Exception:
-                        # If UI update fails, continue loop
-                        pass
-                
-                # Wait 1 second or until stop event
-                self.timer_stop_event.wait(1.0)
-        except Exception as e:
-            print(f"Warning: Timer worker error: {e}")
-
     def _build_reference_controls(self):
         """Build mood board image controls with previews - UPDATED ASPECT RATIO."""
         # Mood board image previews with borders
@@ -715,26 +1223,31 @@ Quick Guide:
         self.status_model_label.Font = Drawing.Fonts.Sans(10)
         
         self.status_session_label = Forms.Label()
-        self.status_session_label.Text = "Session: $0.00"
+        self._last_session_text = "Session: $0.00"
+        self.status_session_label.Text = self._last_session_text
         self.status_session_label.Font = Drawing.Fonts.Sans(10)
         
         self.status_total_label = Forms.Label()
         total_cost = self.settings.get("total_cost", 0.0)
-        self.status_total_label.Text = f"Total: ${total_cost:.2f}"
+        self._last_total_text = f"Total: ${total_cost:.2f}"
+        self.status_total_label.Text = self._last_total_text
         self.status_total_label.Font = Drawing.Fonts.Sans(10)
 
+    # Shared values for the structural widgets below, resolved once
+    _SEPARATOR_COLOR = Drawing.Colors.Gray
+    _SEPARATOR_SIZE = Drawing.Size(425, 1)
+
     def _create_label(self, text):
-        """Helper method to create labels."""
+        """Helper method to create labels (left aligned, Eto's default)."""
         label = Forms.Label()
         label.Text = text
-        label.TextAlignment = TextAlignment.Left
         return label
 
     def _create_separator(self):
         """Create a horizontal separator line."""
         separator = Forms.Panel()
-        separator.BackgroundColor = Drawing.Colors.Gray
-        separator.Size = Drawing.Size(425, 1)
+        separator.BackgroundColor = self._SEPARATOR_COLOR
+        separator.Size = self._SEPARATOR_SIZE
         return separator
 
     def _update_prompt_state(self):
@@ -773,20 +1286,29 @@ Quick Guide:
         # Tab 2: Prompt Log
         log_tab = Forms.TabPage()
         log_tab.Text = "Prompt Log"
-        log_tab.Content = self._create_log_tab()
+        log_tab.Content = Forms.Panel()
         tabs.Pages.Add(log_tab)
         
         # Tab 3: Setup
         setup_tab = Forms.TabPage()
         setup_tab.Text = "Setup"
-        setup_tab.Content = self._create_setup_tab()
+        setup_tab.Content = Forms.Panel()
         tabs.Pages.Add(setup_tab)
         
         # Tab 4: About
         about_tab = Forms.TabPage()
         about_tab.Text = "About"
-        about_tab.Content = self._create_about_tab()
+        about_tab.Content = Forms.Panel()
         tabs.Pages.Add(about_tab)
+
+        # Only the Render tab is built up front; the others on first selection
+        self._tabs = tabs
+        self._tab_builders = {
+            1: self._create_log_tab,
+            2: self._create_setup_tab,
+            3: self._create_about_tab,
+        }
+        tabs.SelectedIndexChanged += self._on_tab_changed
         
         # Add tabs to main layout
         main_layout.AddRow(tabs)
@@ -811,6 +1333,13 @@ Quick Guide:
         # Set main content
         self.Content = main_layout
 
+    def _on_tab_changed(self, sender, e):
+        """Build a tab's content the first time it is selected."""
+        index = self._tabs.SelectedIndex
+        builder = self._tab_builders.pop(index, None)
+        if builder is not None:
+            self._tabs.Pages[index].Content = builder()
+
     def _create_render_tab(self):
         """Create the Render tab content."""
         layout = Forms.DynamicLayout()
@@ -830,6 +1359,7 @@ Quick Guide:
         button_table.Rows.Add(Forms.TableRow(
             Forms.TableCell(self.capture_viewport_btn, True),
             Forms.TableCell(self.generate_btn, True),
+            Forms.TableCell(self.variants_btn, True),
             Forms.TableCell(self.iterate_btn, True)
         ))
         
@@ -891,29 +1421,18 @@ Quick Guide:
         ))
         layout.Add(title_row)
 
-        # Compute column width to fit inside the tab (~580 px content width)
-        # Keep existing gaps (assumed ~8 px); adjust only if your tab padding differs
-        col_gap = 10
-        content_w = 580
-        col_w = int((content_w - 3 * col_gap) / 4)
-        img_w = col_w
-        img_h = int(round(img_w * 9.0 / 16.0))  # 16:9
-
-        # Ensure reference controls exist
-        if not hasattr(self, 'ref_previews'):
-            self._build_reference_controls()
+        # Column geometry fits the ~580 px tab content width (MOOD_* constants)
+        col_gap = MOOD_COL_GAP
+        img_w = MOOD_COL_WIDTH
+        img_h = MOOD_IMG_HEIGHT
 
         # Update preview & panel sizes to 16:9 while keeping width
-        for i in range(4):
-            try:
-                if hasattr(self.ref_previews[i], 'Size'):
-                    self.ref_previews[i].Size = Drawing.Size(img_w, img_h)
-                if hasattr(self.ref_preview_panels[i], 'Size'):
-                    self.ref_preview_panels[i].Size = Drawing.Size(img_w, img_h + 6)  # + padding
-                    self.ref_preview_panels[i].Padding = Drawing.Padding(3)
-                    self.ref_preview_panels[i].Text = ""
-            except Exception:
-                pass
+        # (padding and empty title are already set by _build_reference_controls)
+        preview_size = Drawing.Size(img_w, img_h)
+        panel_size = Drawing.Size(img_w, img_h + 6)  # + padding
+        for preview, panel in zip(self.ref_previews, self.ref_preview_panels):
+            preview.Size = preview_size
+            panel.Size = panel_size
 
         # Build a 4×2 table
         mood_table = Forms.TableLayout()
@@ -931,14 +1450,12 @@ Quick Guide:
             file_btn = self.ref_file_btns[i]
             clear_btn = self.ref_clear_btns[i]
 
-            half_w = int((col_w - 6) / 2)  # Account for spacing between buttons
-            
-            # Set exact button dimensions
             for b in (file_btn, clear_btn):
                 try:
-                    b.Size = Drawing.Size(half_w, 30)
-                    b.MinimumSize = Drawing.Size(half_w, 30)
-                    b.MaximumSize = Drawing.Size(half_w, 30)
+                    size = Drawing.Size(MOOD_BTN_WIDTH, 30)
+                    b.Size = size
+                    b.MinimumSize = size
+                    b.MaximumSize = size
                 except Exception:
                     pass
             
@@ -1125,18 +1642,40 @@ Anthropic Claude
     def _clear_reference_image(self, index):
         """Clear a mood board image."""
         self.ref_previews[index].Image = None
-        # Also remove the stored file path so it won't be included in API requests
-        if hasattr(self.ref_previews[index], '_file_path'):
-            delattr(self.ref_previews[index], '_file_path')
+        # Also remove the stored file path and bytes so it won't be included in API requests
+        for attr in ('_file_path', '_cached_part_bytes', '_cached_mime', '_cached_stat'):
+            if hasattr(self.ref_previews[index], attr):
+                delattr(self.ref_previews[index], attr)
 
     def _load_reference_preview(self, index, file_path):
         """Load mood board image preview."""
         try:
             if file_path and Path(file_path).exists():
-                eto_bitmap = Drawing.Bitmap(file_path)
-                self.ref_previews[index].Image = eto_bitmap
+                # Read the file once here; Generate sends these bytes as-is
+                st = os.stat(file_path)
+                data = read_file_cached(file_path, st)
+                # Reselecting an unchanged file reuses the thumbnail; only panel-sized
+                # bitmaps are kept, never the full-resolution decode
+                preview = self.ref_previews[index]
+                key = (file_path, st.st_mtime_ns)
+                eto_bitmap = self._ref_cache.get(key)
+                if eto_bitmap is None:
+                    sys_bitmap = SD.Bitmap(MemoryStream(data, False))
+                    try:
+                        eto_bitmap = self._make_thumbnail(sys_bitmap, preview)
+                    finally:
+                        sys_bitmap.Dispose()
+                    self._ref_cache[key] = eto_bitmap
+                    if len(self._ref_cache) > _REF_CACHE_SIZE:
+                        self._ref_cache.popitem(last=False)
+                else:
+                    self._ref_cache.move_to_end(key)
+                preview.Image = eto_bitmap
                 # Store file path for later use
-                setattr(self.ref_previews[index], '_file_path', file_path)
+                setattr(preview, '_file_path', file_path)
+                setattr(preview, '_cached_part_bytes', data)
+                setattr(preview, '_cached_mime', guess_mime_type(file_path))
+                setattr(preview, '_cached_stat', (st.st_mtime_ns, st.st_size))
         except Exception as e:
             self._append_chat_log(f"Failed to load mood board preview #{index + 1}: {e}")
 
@@ -1168,50 +1707,55 @@ Anthropic Claude
             self._append_chat_log(f"Failed to open folder: {e}")
 
     def _update_viewport_preview(self, bitmap):
-        """Update viewport preview with captured image."""
+        """Update viewport preview with captured image.
+
+        Only a panel-sized thumbnail is encoded, never the full image.
+        """
         try:
             if not bitmap or not self.viewport_preview:
                 return
-                
-            # Use reliable file-based conversion method
-            temp_dir = Path(self.output_folder_tb.Text)
-            temp_dir.mkdir(exist_ok=True)
-            temp_path = temp_dir / f"viewport_preview_{time.strftime('%H%M%S')}.png"
-            
-            # Save original bitmap to temp file
-            bitmap.Save(str(temp_path), Imaging.ImageFormat.Png)
             
-            # Load as Eto bitmap
-            eto_bitmap = Drawing.Bitmap(str(temp_path))
-            self.viewport_preview.Image = eto_bitmap
+            # Encode a panel-sized thumbnail instead of the full image
+            preview_size = self.viewport_preview.Size
+            thumbnail = fit_bitmap(bitmap, preview_size.Width, preview_size.Height)
+            try:
+                image_bytes = bitmap_to_png_bytes(thumbnail)
+            finally:
+                if thumbnail is not bitmap:
+                    thumbnail.Dispose()
             
-            # Clean up temp file
+            # Decode straight from memory - no temp file round trip
             try:
-                temp_path.unlink()
+                eto_bitmap = Drawing.Bitmap(MemoryStream(image_bytes))
             except Exception:
-                pass
+                # Stream decoding unsupported: reuse one fixed temp file
+                PREVIEW_TEMP_PATH.write_bytes(image_bytes)
+                eto_bitmap = Drawing.Bitmap(str(PREVIEW_TEMP_PATH))
+            self.viewport_preview.Image = eto_bitmap
                     
         except Exception as e:
             pass
 
+    def _make_thumbnail(self, bitmap, panel):
+        """Return an Eto bitmap of a .NET Bitmap downscaled to fit panel."""
+        size = panel.Size
+        thumbnail = fit_bitmap(bitmap, size.Width, size.Height)
+        try:
+            return Drawing.Bitmap(MemoryStream(bitmap_to_png_bytes(thumbnail)))
+        finally:
+            if thumbnail is not bitmap:
+                thumbnail.Dispose()
+
     def _format_camera_info_for_prompt(self, camera_info):
         """Format camera information for inclusion in AI prompts."""
         if not camera_info:
             return ""
-        
-        # Build camera description for the AI
-        camera_desc = []
-        
-        if camera_info.get('type') == 'perspective':
-            camera_desc.append(f"Shot with a {camera_info.get('lens_length', 'unknown')} {camera_info.get('lens_type', 'lens')}")
-            if camera_info.get('field_of_view'):
-                camera_desc.append(f"field of view {camera_info.get('field_of_view')}")
-        elif camera_info.get('type') == 'parallel':
-            camera_desc.append("Shot with orthographic projection (no perspective distortion)")
-        
-        if camera_desc:
-            return f"Camera settings: {', '.join(camera_desc)}. "
-        return ""
+        return camera_prompt_text(
+            camera_info.get('type'),
+            camera_info.get('lens_length', 'unknown'),
+            camera_info.get('lens_type', 'lens'),
+            camera_info.get('field_of_view'),
+        )
 
     def _append_chat_log(self, message, user_input=False, ai_response=False):
         """Append message to chat log with Prompt formatting."""
@@ -1219,44 +1763,125 @@ Anthropic Claude
         
         if user_input:
             # User input formatting
-            self.chat_log_tb.Text += f"\n[{timestamp}] You: {message}\n"
+            entry = f"\n[{timestamp}] You: {message}\n"
         elif ai_response:
             # AI response formatting
-            self.chat_log_tb.Text += f"[{timestamp}] Nano 🍌: {message}\n"
+            entry = f"[{timestamp}] Nano 🍌: {message}\n"
         else:
             # System message formatting
-            self.chat_log_tb.Text += f"[{timestamp}] System: {message}\n"
-        
-        # Auto-scroll to bottom
-        self.chat_log_tb.CaretIndex = len(self.chat_log_tb.Text)
+            entry = f"[{timestamp}] System: {message}\n"
+        
+        # Buffer the entry; bursts of messages reach the TextArea as one Append
+        with self._log_lock:
+            self._log_buffer.append(entry)
+        self._schedule_ui_flush()
+
+    def _setup_ui_flush(self):
+        """Create the UITimer that coalesces chat log and status bar updates."""
+        self._log_buffer = []
+        self._log_lock = threading.Lock()  # guards _log_buffer against worker threads
+        self._status_dirty = False
+        try:
+            self._flush_timer = Forms.UITimer()
+            self._flush_timer.Interval = 0.1
+            self._flush_timer.Elapsed += self._flush_ui_updates
+        except Exception:
+            # Without UITimer every update is applied immediately
+            self._flush_timer = None
+
+    def _schedule_ui_flush(self):
+        """Apply pending log/status updates within 100 ms, at most once per tick.
+
+        Safe to call from worker threads; the flush is marshalled to the UI thread.
+        """
+        if threading.get_ident() != self._ui_thread_id:
+            Forms.Application.Instance.AsyncInvoke(self._schedule_ui_flush)
+        elif self._flush_timer is None:
+            self._flush_ui_updates()
+        elif not self._flush_timer.Started:
+            self._flush_timer.Start()
+
+    def _flush_ui_updates(self, sender=None, e=None):
+        """Write buffered log entries and refresh the status bar if it changed."""
+        if self._flush_timer is not None:
+            self._flush_timer.Stop()
+        # Swap the buffer under the lock so entries added by workers meanwhile are kept
+        with self._log_lock:
+            entries, self._log_buffer = self._log_buffer, []
+        if entries:
+            self.chat_log_tb.Append("".join(entries), True)
+        if self._status_dirty:
+            self._status_dirty = False
+            self._refresh_status_bar()
 
     def _update_status_bar(self):
+        """Mark the status bar for refresh on the next UI flush."""
+        self._status_dirty = True
+        self._schedule_ui_flush()
+
+    def _refresh_status_bar(self):
         """Update status bar with current session and total usage."""
         try:
-            # Update session stats (cost only)
-            self.status_session_label.Text = f"Session: ${self.session_cost:.2f}"
+            # Update session stats (cost only); labels are only touched when the text changes
+            session_text = f"Session: ${self.session_cost:.2f}"
+            if session_text != self._last_session_text:
+                self.status_session_label.Text = session_text
+                self._last_session_text = session_text
             
             # Update total stats from settings (cost only)
-            total_cost = self.settings.get("total_cost", 0.0)
-            self.status_total_label.Text = f"Total: ${total_cost:.2f}"
+            total_text = f"Total: ${self.settings.get('total_cost', 0.0):.2f}"
+            if total_text != self._last_total_text:
+                self.status_total_label.Text = total_text
+                self._last_total_text = total_text
             
         except Exception as e:
             self._append_chat_log(f"Failed to update status bar: {e}")
 
-    def _save_current_settings(self):
-        """Save current form settings to JSON file."""
+    def _save_current_settings(self, prompt_text=None):
+        """Save current form settings to JSON file.
+
+        prompt_text skips re-reading the prompt box when the caller already has it.
+        """
         try:
             # Don't save placeholder text
-            prompt_text = "" if self._prompt_placeholder_active else self.prompt_tb.Text
+            if prompt_text is None:
+                prompt_text = "" if self._prompt_placeholder_active else (self.prompt_tb.Text or "")
             self.settings.update({
                 "api_key": self.api_key_tb.Text,
                 "output_folder": self.output_folder_tb.Text,
                 "prompt": prompt_text
             })
-            save_settings(self.settings)
+            self._settings_dirty = True
+            self._flush_settings_if_dirty()
         except Exception as e:
             self._append_chat_log(f"Failed to save settings: {e}")
 
+    def _setup_settings_flush(self):
+        """Create the UITimer that writes changed settings at most every 2 s."""
+        self._settings_dirty = False
+        try:
+            self._settings_timer = Forms.UITimer()
+            self._settings_timer.Interval = 2.0
+            self._settings_timer.Elapsed += self._flush_settings_if_dirty
+        except Exception:
+            self._settings_timer = None
+
+    def _mark_settings_dirty(self):
+        """Schedule a settings write instead of writing on every change."""
+        self._settings_dirty = True
+        if self._settings_timer is None:
+            self._flush_settings_if_dirty()
+        elif not self._settings_timer.Started:
+            self._settings_timer.Start()
+
+    def _flush_settings_if_dirty(self, sender=None, e=None):
+        """Write settings to disk if they changed since the last write."""
+        if self._settings_timer is not None:
+            self._settings_timer.Stop()
+        if self._settings_dirty:
+            save_settings(self.settings)
+            self._settings_dirty = False
+
     def _track_cumulative_usage(self, tokens, cost, show_session_cost=True):
         """Track cumulative usage across sessions and update status bar."""
         try:
@@ -1264,15 +1889,12 @@ Anthropic Claude
             self.session_tokens += tokens
             self.session_cost += cost
             
-            # Update settings with cumulative totals
-            current_total_tokens = self.settings.get("total_tokens_used", 0)
-            current_total_cost = self.settings.get("total_cost", 0.0)
-            
-            self.settings["total_tokens_used"] = current_total_tokens + tokens
-            self.settings["total_cost"] = current_total_cost + cost
-            self.settings["last_generation_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            save_settings(self.settings)
+            # Update settings with cumulative totals; written by the settings timer
+            if tokens or cost:
+                self.settings["total_tokens_used"] = self.settings.get("total_tokens_used", 0) + tokens
+                self.settings["total_cost"] = self.settings.get("total_cost", 0.0) + cost
+                self.settings["last_generation_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                self._mark_settings_dirty()
             
             # Update status bar display
             self._update_status_bar()
@@ -1310,9 +1932,11 @@ Anthropic Claude
             if result == Forms.DialogResult.No:
                 return  # User cancelled, exit early
             
-            # Use a timer to delay execution and let dialog close
-            import threading
-            delay_timer = threading.Timer(0.5, self._execute_capture_viewport)
+            # Use a timer to delay execution and let dialog close; the capture
+            # itself still runs on the UI thread
+            delay_timer = threading.Timer(
+                0.5, lambda: Forms.Application.Instance.AsyncInvoke(self._execute_capture_viewport)
+            )
             delay_timer.start()
         else:
             # First capture, execute immediately
@@ -1320,12 +1944,18 @@ Anthropic Claude
     
     def _execute_capture_viewport(self):
         """Execute the actual viewport capture and processing."""
+        # A running generate still owns Prompt_history (the delayed call can land mid-request)
+        if self._in_flight or self._capture_in_flight:
+            self._append_chat_log("Please wait for the current request to finish before capturing.")
+            return
         try:
             # Mark that we've done at least one capture
             self._first_capture = False
             
             # PURGE MEMORY AND START FRESH
             self.Prompt_history = []
+            self._history_version += 1
+            self._image_parts = {}
             
             # Start timer for processing
             self._start_timer()
@@ -1337,22 +1967,21 @@ Anthropic Claude
                 self._stop_timer()
                 return
 
-            # Validate output folder
-            output_dir = Path(self.output_folder_tb.Text)
-            if not output_dir.exists():
-                try:
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                except Exception as e:
-                    self._append_chat_log(f"Error: Cannot create output directory: {e}")
-                    self._stop_timer()
-                    return
+            # Validate output folder (cached until the folder changes)
+            try:
+                output_dir = self._get_output_dir()
+            except Exception as e:
+                self._append_chat_log(f"Error: Cannot create output directory: {e}")
+                self._stop_timer()
+                return
             
             # Capture viewport with clean background (curves hidden)
-            bitmap, png_bytes, camera_info = capture_active_view_shaded()
+            bitmap, image_bytes, image_mime, camera_info = capture_active_view_shaded()
             
             # Store the captured data
             self._last_viewport_bitmap = bitmap
-            self._captured_viewport_bytes = png_bytes
+            self._captured_viewport_bytes = image_bytes
+            self._captured_viewport_mime = image_mime
             self._camera_info = camera_info
             self._viewport_captured = True
             
@@ -1372,8 +2001,7 @@ Anthropic Claude
             
             # IMMEDIATELY PROCESS WITH STRUCTURED PROMPT
             try:
-                from google import genai
-                from google.genai import types
+                genai, types = _get_genai()
             except ImportError as e:
                 self._append_chat_log(f"Error: Failed to import google-genai: {e}")
                 self._stop_timer()
@@ -1381,7 +2009,7 @@ Anthropic Claude
 
             # BUILD STRUCTURED PROMPT WITH CAMERA INFO
             camera_prompt_addition = self._format_camera_info_for_prompt(camera_info)
-            structured_prompt = f"Place what you see in the 3D viewport capture in a photo studio with a soft infinite white background. Always use the same soft daylight-like illumination. {camera_prompt_addition}Compare your result with the reference image and do not release it until the result is a complete match. Do not modify or change anything that doesn't match the viewport image in any way."
+            structured_prompt = self._STRUCTURED_PROMPT_PREFIX + camera_prompt_addition + self._STRUCTURED_PROMPT_SUFFIX
             
             # Log the structured prompt to chat
             self._append_chat_log(structured_prompt, user_input=True)
@@ -1389,7 +2017,7 @@ Anthropic Claude
             # Build content parts - CAPTURE VIEW IGNORES MOOD BOARD
             parts = []
             parts.append(types.Part.from_text(text=structured_prompt))
-            parts.append(types.Part.from_bytes(data=png_bytes, mime_type="image/png"))
+            parts.append(self._viewport_part())
             
             # NOTE: Mood board images are NOT included during Capture View
             # They are only used during Generate operations
@@ -1397,38 +2025,76 @@ Anthropic Claude
             contents = [types.Content(role="user", parts=parts)]
 
             # Store initial Prompt in history
-            self.Prompt_history = contents.copy()
+            self.Prompt_history = contents
             
-            # Call Gemini API with structured prompt
-            client = genai.Client(api_key=api_key)
-            config = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"])
+            # Call Gemini API with structured prompt on a worker thread
+            self._capture_in_flight = True
+            self.capture_viewport_btn.Enabled = False
+            threading.Thread(
+                target=self._do_capture_processing,
+                args=(api_key, contents, output_dir, self._history_version),
+                daemon=True,
+            ).start()
             
-            response = client.models.generate_content(
+        except Exception as e:
+            self._append_chat_log(f"Failed to capture and process viewport: {e}")
+            self._stop_timer()
+
+    def _do_capture_processing(self, api_key, contents, output_dir, history_version):
+        """Send the captured viewport to Gemini off the UI thread."""
+        response = None
+        error = None
+        try:
+            _, types = _get_genai()
+            config = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"])
+            response = self._client(api_key).models.generate_content(
                 model=self.model, 
                 contents=contents, 
                 config=config
             )
-            
+        except Exception as e:
+            error = e
+        Forms.Application.Instance.AsyncInvoke(
+            lambda: self._apply_capture_result(response, output_dir, error, history_version)
+        )
+
+    def _apply_capture_result(self, response, output_dir, error, history_version):
+        """Show the processed viewport (runs on the UI thread)."""
+        self._capture_in_flight = False
+        self.capture_viewport_btn.Enabled = True
+        if error is not None:
+            self._append_chat_log(f"Failed to capture and process viewport: {error}")
+        else:
             # Process response and show result
-            self._process_response(response, output_dir, is_viewport_processing=True, show_usage=False)
+            self._process_response(response, output_dir, is_viewport_processing=True, show_usage=False, history_version=history_version)
             
             # Enable both generate and iterate buttons
-            self.generate_btn.Enabled = True
-            self.iterate_btn.Enabled = True
-            
-            # Stop timer
-            self._stop_timer()
-            
-        except Exception as e:
-            self._append_chat_log(f"Failed to capture and process viewport: {e}")
-            self._stop_timer()
+            self._iterate_ready = True
+            self._update_request_buttons()
+        
+        # Stop timer
+        self._stop_timer()
 
-    def on_generate(self, sender, event):
-        """Handle generate button - UNRESTRICTED GENERATION."""
+    def _update_request_buttons(self):
+        """Enable Generate, Variants and Iterate for whatever is not still pending.
+
+        A generate request holds all three; a variants batch only holds
+        Variants and Iterate, so Generate stays usable while it runs.
+        """
+        self.generate_btn.Enabled = not self._in_flight
+        self.variants_btn.Enabled = not (self._in_flight or self._batch_in_flight)
+        self.iterate_btn.Enabled = self._iterate_ready and not (self._in_flight or self._batch_in_flight)
+
+    def _prepare_generate(self):
+        """Validate the form and build the prompt for a generate request.
+
+        Returns (api_key, full_prompt, has_user_input, output_dir),
+        or None after telling the user what is missing.
+        """
         # Check if viewport captured
         if not self._viewport_captured or not self._captured_viewport_bytes:
             self._append_chat_log("Please capture viewport first!")
-            return
+            return None
         
         # Check if API key is entered
         api_key = self.api_key_tb.Text or os.environ.get("GEMINI_API_KEY", "")
@@ -1440,141 +2106,263 @@ Anthropic Claude
                 Forms.MessageBoxButtons.OK,
                 Forms.MessageBoxType.Warning
             )
-            return
+            return None
         
         # Start timer
         self._start_timer()
         
+        # Read the prompt box once, for both the settings and the request
+        raw_prompt = "" if self._prompt_placeholder_active else (self.prompt_tb.Text or "")
+        
         # Save current settings first
-        self._save_current_settings()
+        self._save_current_settings(raw_prompt)
         
         # Get user prompt
-        user_prompt = self.prompt_tb.Text.strip() if self.prompt_tb.Text and not self._prompt_placeholder_active else ""
+        user_prompt = raw_prompt.strip()
         has_user_input = bool(user_prompt)
         
         # Build the full prompt that will be sent
-        strict_instruction = "Follow the primary reference image strictly. Do not change the camera angle, form, or composition. "
         if has_user_input:
-            full_prompt = strict_instruction + user_prompt
+            full_prompt = self._STRICT_INSTRUCTION + user_prompt
         else:
-            full_prompt = strict_instruction + "Create an image based on this reference."
+            full_prompt = self._STRICT_INSTRUCTION + "Create an image based on this reference."
         
         # Log the full prompt to chat
         self._append_chat_log(full_prompt, user_input=True)
         
-        # Validate output folder
-        output_dir = Path(self.output_folder_tb.Text)
-        if not output_dir.exists():
-            try:
-                output_dir.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                self._append_chat_log(f"Error: Cannot create output directory: {e}")
-                self._stop_timer()
-                return
+        # Validate output folder (cached until the folder changes)
+        try:
+            output_dir = self._get_output_dir()
+        except Exception as e:
+            self._append_chat_log(f"Error: Cannot create output directory: {e}")
+            self._stop_timer()
+            return None
 
-        # IMPORT GEMINI API
+        # CHECK GEMINI API IS AVAILABLE (imported once, see _get_genai)
         try:
-            from google import genai
-            from google.genai import types
+            _get_genai()
         except ImportError as e:
             self._append_chat_log(f"Error: Failed to import google-genai: {e}")
             self._stop_timer()
+            return None
+
+        return api_key, full_prompt, has_user_input, output_dir
+
+    def on_generate(self, sender, event):
+        """Handle generate button - UNRESTRICTED GENERATION."""
+        # Ignore clicks while a request is already running
+        if self._in_flight or self._capture_in_flight:
             return
 
-        # BUILD SIMPLE, UNRESTRICTED CONTENT PARTS
-        parts = []
-        
-        # 1. Add the Primary Reference image FIRST
-        parts.append(types.Part.from_bytes(data=self._captured_viewport_bytes, mime_type="image/png"))
-        
-        # 2. Add the full prompt (already built with strict instruction)
-        parts.append(types.Part.from_text(text=full_prompt))
-        
-        # 3. Add mood board images for styling inspiration LAST
-        for i, preview in enumerate(self.ref_previews):
-            file_path = getattr(preview, '_file_path', None)
-            if file_path:
-                part = read_file_as_part(file_path)
-                if part is not None:
-                    parts.append(part)
+        request = self._prepare_generate()
+        if request is None:
+            return
+        api_key, full_prompt, has_user_input, output_dir = request
+
+        # Hand the network work to a worker; only the result comes back to the UI thread
+        self._in_flight = True
+        self.capture_viewport_btn.Enabled = False
+        self._update_request_buttons()
+
+        # Snapshot the conversation here on the UI thread. A fresh prompt starts a new
+        # history; if a capture replaces it mid-request the response is seen as stale
+        if not self.Prompt_history:
+            self.Prompt_history = []
+            self._history_version += 1
+        worker = threading.Thread(
+            target=self._do_generate,
+            args=(api_key, full_prompt, has_user_input, output_dir,
+                  self.Prompt_history, self._history_version, self._viewport_part(), self._mood_board_refs()),
+            daemon=True,
+        )
+        worker.start()
 
-        contents = [types.Content(role="user", parts=parts)]
+    def _do_generate(self, api_key, full_prompt, has_user_input, output_dir,
+                     history, history_version, viewport_part, mood_refs):
+        """Build the request and call Gemini off the UI thread.
 
-        # CALL GEMINI API
+        Mood board uploads happen here as well. history, history_version,
+        viewport_part and mood_refs are snapshotted by on_generate; the
+        worker only extends history, never self.Prompt_history. The
+        response (or error) is handed to _apply_result on the UI thread.
+        """
+        response = None
+        error = None
         try:
-            # Get API key (already validated at the start)
-            api_key = self.api_key_tb.Text or os.environ.get("GEMINI_API_KEY", "")
-            client = genai.Client(api_key=api_key)
-            
+            genai, types = _get_genai()
+            client = self._client(api_key)
+            mood_parts = self._mood_board_parts(api_key, mood_refs)
+
             # Determine if this is a fresh Prompt or iteration
-            is_iteration = len(self.Prompt_history) > 0
+            is_iteration = len(history) > 0
+
+            # Strict instruction + prompt, built once; an iteration without new input just continues
+            if is_iteration and not has_user_input:
+                prompt_text = self._STRICT_INSTRUCTION + "Continue with this image"
+            else:
+                prompt_text = full_prompt
+            text_part = types.Part.from_text(text=prompt_text)
+
+            # BUILD SIMPLE, UNRESTRICTED CONTENT PARTS
+            # Primary Reference FIRST, then the prompt, then mood board images for styling LAST
+            parts = [viewport_part, text_part]
+            parts.extend(mood_parts)
+
+            # Use simple config for fresh prompts and iterations to maintain Prompt flow
+            config = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"])
             
+            # Add new user message to Prompt history; iterations keep only recent exchanges
+            history.append(types.Content(role="user", parts=parts))
             if is_iteration:
-                # ITERATION: Use Prompt history for context
-                # Add the new user input to Prompt history with proper order
-                current_request_parts = []
-                
-                # 1. Primary Reference first
-                current_request_parts.append(types.Part.from_bytes(data=self._captured_viewport_bytes, mime_type="image/png"))
-                
-                # 2. Strict instruction + prompt
-                strict_instruction = "Follow the primary reference image strictly. Do not change the camera angle, form, or composition. "
-                if has_user_input:
-                    iteration_prompt = strict_instruction + user_prompt
-                else:
-                    iteration_prompt = strict_instruction + "Continue with this image"
-                current_request_parts.append(types.Part.from_text(text=iteration_prompt))
-                
-                # 3. Mood board images last
-                for i, preview in enumerate(self.ref_previews):
-                    file_path = getattr(preview, '_file_path', None)
-                    if file_path:
-                        part = read_file_as_part(file_path)
-                        if part is not None:
-                            current_request_parts.append(part)
-                
-                # Add new user message to Prompt history
-                self.Prompt_history.append(types.Content(role="user", parts=current_request_parts))
-                
-                # Use full prompt history for API call
-                contents = self.Prompt_history
-                
-                # Use simple config for iterations to maintain Prompt flow
-                config = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"])
-                
-            else:
-                # FRESH Prompt: Simple unrestricted generation
-                # Use simple config
-                config = types.GenerateContentConfig(response_modalities=["IMAGE", "TEXT"])
-                
-                # Use the constructed parts for fresh Prompt (already built above)
-                contents = [types.Content(role="user", parts=parts)]
-                
-                # Store initial Prompt in history
-                self.Prompt_history = contents.copy()
+                trim_history(history)
+                self._prune_image_parts(history)
+            contents = history
                 
+            # CALL GEMINI API
             response = client.models.generate_content(
                 model=self.model, 
                 contents=contents, 
                 config=config
             )
         except Exception as e:
-            self._append_chat_log(f"API error: {e}")
+            error = e
+        Forms.Application.Instance.AsyncInvoke(
+            lambda: self._apply_result(response, output_dir, error, history_version)
+        )
+
+    def _apply_result(self, response, output_dir, error, history_version):
+        """Show the outcome of a generate request (runs on the UI thread)."""
+        self._in_flight = False
+        self.capture_viewport_btn.Enabled = True
+        if error is not None:
+            self._append_chat_log(f"API error: {error}")
+        else:
+            # EXTRACT AND SAVE IMAGE
+            self._process_response(response, output_dir, show_usage=False, history_version=history_version)
+            self._iterate_ready = True
+        self._update_request_buttons()
+        if not self._batch_in_flight:
             self._stop_timer()
+
+    def on_generate_batch(self, sender, event, n=BATCH_VARIANTS):
+        """Handle variants button - submit n variants of the prompt as one batch job.
+
+        Only Variants and Iterate wait for the batch; Generate stays usable.
+        """
+        # Ignore clicks while a request is already running
+        if self._in_flight or self._capture_in_flight or self._batch_in_flight:
+            return
+        request = self._prepare_generate()
+        if request is None:
             return
+        api_key, full_prompt, has_user_input, output_dir = request
+
+        # An iteration without new input just continues, as in _do_generate
+        if self.Prompt_history and not has_user_input:
+            full_prompt = self._STRICT_INSTRUCTION + "Continue with this image"
+
+        self._append_chat_log(f"Submitting {n} variants as a batch job - results can take several minutes.")
+        self._batch_in_flight = True
+        self._update_request_buttons()
+        worker = threading.Thread(
+            target=self._do_generate_batch,
+            args=(api_key, full_prompt, output_dir, n, self._history_version, self._viewport_part(),
+                  self._mood_board_refs()),
+            daemon=True,
+        )
+        worker.start()
 
-        # EXTRACT AND SAVE IMAGE
-        self._process_response(response, output_dir, show_usage=False)
-        
-        # Enable iterate button
-        self.iterate_btn.Enabled = True
-        
-        # Stop timer
-        self._stop_timer()
+    def _do_generate_batch(self, api_key, prompt_text, output_dir, n, history_version, viewport_part, mood_refs):
+        """Run a variants batch job and poll it until it finishes (off the UI thread).
+
+        The variants differ only by seed and are not added to Prompt_history.
+        Each inline request carries only the current turn: the Primary
+        Reference already holds the image being iterated, and repeating the
+        whole history n times would overrun the inline batch size limit.
+        If the form closes first, polling stops and the job is cancelled.
+        """
+        variants = []
+        errors = []
+        error = None
+        try:
+            genai, types = _get_genai()
+            client = self._client(api_key)
+
+            parts = [viewport_part, types.Part.from_text(text=prompt_text)]
+            parts.extend(self._mood_board_parts(api_key, mood_refs))
+            contents = [types.Content(role="user", parts=parts)]
+
+            requests = [
+                {"contents": contents, "config": {"response_modalities": ["IMAGE", "TEXT"], "seed": seed}}
+                for seed in range(n)
+            ]
+            job = client.batches.create(model=self.model, src=requests, config={"display_name": "nano-banana-variants"})
+
+            # Poll with exponential backoff; batch jobs are queued, not served immediately
+            delay = 2.0
+            state = getattr(job.state, "name", str(job.state))
+            while state not in _BATCH_DONE_STATES:
+                if self._batch_stop.wait(delay):
+                    # The form closed, so nothing is left to show the variants in
+                    try:
+                        client.batches.cancel(name=job.name)
+                    except Exception:
+                        pass
+                    return
+                delay = min(delay * 2, BATCH_POLL_MAX)
+                job = client.batches.get(name=job.name)
+                new_state = getattr(job.state, "name", str(job.state))
+                if new_state != state:
+                    self._append_chat_log(f"Batch job: {new_state}")
+                    state = new_state
+            if state != "JOB_STATE_SUCCEEDED":
+                raise RuntimeError(f"batch job ended with {state}")
+
+            # Number the variants by request so failed ones keep their slot
+            for variant, inlined in enumerate(getattr(job.dest, "inlined_responses", None) or [], 1):
+                if getattr(inlined, "error", None) is not None:
+                    errors.append(f"variant {variant}: {inlined.error}")
+                elif getattr(inlined, "response", None) is not None:
+                    variants.append((variant, inlined.response))
+        except Exception as e:
+            error = e
+        Forms.Application.Instance.AsyncInvoke(
+            lambda: self._apply_batch_result(variants, errors, output_dir, error, history_version)
+        )
+
+    def _apply_batch_result(self, variants, errors, output_dir, error, history_version):
+        """Save and show the variants from a batch job (runs on the UI thread).
+
+        Every variant is saved and its path logged; the first one becomes the
+        result preview and the image Iterate continues from, unless a capture
+        or fresh prompt replaced the conversation while the batch ran.
+        """
+        self._batch_in_flight = False
+        stale = history_version != self._history_version
+        for message in errors:
+            self._append_chat_log(f"Batch error: {message}")
+        if error is not None:
+            self._append_chat_log(f"Batch error: {error}")
+        elif not variants:
+            self._append_chat_log("Error: The batch job returned no variants.")
+        else:
+            # A stale batch is only saved; it must not become the image Iterate continues from
+            shown = stale
+            for variant, response in variants:
+                if self._process_response(response, output_dir, show_usage=False, variant=variant,
+                                          parse_text=False, show_result=not shown):
+                    shown = True
+            if stale:
+                self._append_chat_log("The conversation changed while the batch ran - variants were saved but not shown.")
+            else:
+                self._iterate_ready = self._iterate_ready or shown
+        self._update_request_buttons()
+        if not self._in_flight:
+            self._stop_timer()
 
     def on_iterate(self, sender, event):
         """Handle iterate button - STEP 3 of chat workflow."""
-        if not self._last_generated_image_path or not Path(self._last_generated_image_path).exists():
+        if self._last_generated_bytes is None:
             self._append_chat_log("No generated image available to iterate with!")
             return
         
@@ -1582,16 +2370,20 @@ Anthropic Claude
             # KEEP CONTEXT AND CHAT MEMORY - DO NOT CLEAR Prompt_history
             
             # Replace the Primary Reference with the generated result
-            # Load the generated image as the new Primary Reference
-            generated_bitmap = SD.Bitmap(str(self._last_generated_image_path))
-            generated_png_bytes = bitmap_to_png_bytes(generated_bitmap)
+            # Decode the bytes kept from the response rather than reading the saved file back
+            generated_bitmap = SD.Bitmap(MemoryStream(self._last_generated_bytes, False))
+            generated_bytes, generated_mime = bitmap_to_upload_bytes(generated_bitmap)
             
             # Update the Primary Reference data
             self._last_viewport_bitmap = generated_bitmap
-            self._captured_viewport_bytes = generated_png_bytes
+            self._captured_viewport_bytes = generated_bytes
+            self._captured_viewport_mime = generated_mime
             
-            # Update the Primary Reference preview
-            self._update_viewport_preview(generated_bitmap)
+            # Update the Primary Reference preview, moving over the result thumbnail when it shows these bytes
+            if self.result_preview.Image is not None and self._result_preview_src is self._last_generated_bytes:
+                self.viewport_preview.Image = self.result_preview.Image
+            else:
+                self._update_viewport_preview(generated_bitmap)
             
             # Clear the generated result preview
             self.result_preview.Image = None
@@ -1606,6 +2398,7 @@ Anthropic Claude
                 self._prompt_placeholder_active = False
             
             # Reset some state for next round
+            self._iterate_ready = False
             self.iterate_btn.Enabled = False  # Disable until next generation
             
             # Keep viewport_captured = True since we now have a valid reference
@@ -1616,36 +2409,38 @@ Anthropic Claude
 
     def on_show_generated(self, sender, event):
         """Handle show generated image button."""
-        if not self._last_generated_image_path or not Path(self._last_generated_image_path).exists():
+        self._wait_for_output_file()
+        if not self._last_generated_image_path or not self._last_generated_path_obj.exists():
             self._append_chat_log("Error: No generated image available to show.")
             return
             
         try:
-            sys_bitmap = SD.Bitmap(str(self._last_generated_image_path))
-            ms = System.IO.MemoryStream()
-            sys_bitmap.Save(ms, Imaging.ImageFormat.Png)
-            ms.Position = 0
-            eto_bitmap = Drawing.Bitmap(ms)
-            
-            # Get dimensions for sizing
-            img_width = sys_bitmap.Width
-            img_height = sys_bitmap.Height
+            # Reuse the bitmap decoded when this file was last shown
+            if self._last_eto_bitmap is not None and self._last_eto_bitmap_path == self._last_generated_image_path:
+                eto_bitmap = self._last_eto_bitmap
+            else:
+                # Load the saved file straight into Eto
+                try:
+                    eto_bitmap = Drawing.Bitmap(str(self._last_generated_image_path))
+                except Exception:
+                    # Eto could not read the file: decode it with System.Drawing instead
+                    sys_bitmap = SD.Bitmap(str(self._last_generated_image_path))
+                    ms = MemoryStream()
+                    sys_bitmap.Save(ms, Imaging.ImageFormat.Png)
+                    ms.Position = 0
+                    eto_bitmap = Drawing.Bitmap(ms)
+                self._last_eto_bitmap = eto_bitmap
+                self._last_eto_bitmap_path = self._last_generated_image_path
             
             # Create viewer dialog
             viewer = Forms.Dialog()
-            viewer.Title = f"Generated Image: {Path(self._last_generated_image_path).name}"
+            viewer.Title = f"Generated Image: {self._last_generated_path_obj.name}"
+            
+            # Size the dialog (limit max size to 1024 px, never upscale)
+            scale = min(1.0, 1024 / eto_bitmap.Width, 1024 / eto_bitmap.Height)
+            display_width = int(eto_bitmap.Width * scale)
+            display_height = int(eto_bitmap.Height * scale)
             
-            # Size the dialog (limit max size)
-            max_width = 1024
-            max_height = 1024
-            if img_width > max_width or img_height > max_height:
-                scale = min(max_width / img_width, max_height / img_height)
-                display_width = int(img_width * scale)
-                display_height = int(img_height * scale)
-            else:
-                display_width = img_width
-                display_height = img_height
-                
             viewer.Size = Drawing.Size(display_width + 40, display_height + 120)
             viewer.Padding = Drawing.Padding(20)
             
@@ -1658,7 +2453,7 @@ Anthropic Claude
             open_folder_btn = Forms.Button()
             open_folder_btn.Text = "Open Folder"
             open_folder_btn.Size = Drawing.Size(150, 35)
-            open_folder_btn.Click += lambda s, e: self._open_folder(Path(self._last_generated_image_path).parent)
+            open_folder_btn.Click += lambda s, e: self._open_folder(self._last_generated_path_obj.parent)
             
             close_btn = Forms.Button()
             close_btn.Text = "Close"
@@ -1681,10 +2476,15 @@ Anthropic Claude
             
         except Exception as e:
             self._append_chat_log(f"Failed to show image: {e}")
-            self._open_folder(Path(self._last_generated_image_path).parent)
+            self._open_folder(self._last_generated_path_obj.parent)
+
+    def _process_response(self, response, output_dir, is_viewport_processing=False, show_usage=True, history_version=None, variant=None, parse_text=True, show_result=True):
+        """Process the Gemini API response and extract image + usage info.
 
-    def _process_response(self, response, output_dir, is_viewport_processing=False, show_usage=True):
-        """Process the Gemini API response and extract image + usage info."""
+        Returns the saved image path, or None if no image was found. With
+        show_result=False the image is saved but not previewed or kept as
+        the last generated image.
+        """
         try:
             # Extract usage information first
             usage_info = getattr(response, 'usage_metadata', None)
@@ -1700,10 +2500,10 @@ Anthropic Claude
                 cost_info = self._calculate_generation_cost(input_tokens, output_tokens)
                 
                 if show_usage:
-                    self._append_chat_log(f"Cost: ${cost_info['total_cost']:.4f} (${cost_info['input_cost']:.4f} input + ${cost_info['output_cost']:.4f} output + ${cost_info['image_cost']:.4f} image)")
+                    self._append_chat_log(f"Cost: ${cost_info.total_cost:.4f} (${cost_info.input_cost:.4f} input + ${cost_info.output_cost:.4f} output + ${cost_info.image_cost:.4f} image)")
                 
                 # Use total_cost for tracking
-                total_cost = cost_info['total_cost']
+                total_cost = cost_info.total_cost
             else:
                 # Fallback if no usage metadata available - estimate based on image generation only
                 pricing = self._get_model_pricing()
@@ -1712,39 +2512,59 @@ Anthropic Claude
                 if show_usage:
                     self._append_chat_log(f"Usage metadata unavailable - estimated cost: ${total_cost:.4f} (image generation only)")
             
+            # Batch variants are billed at the reduced batch rate
+            if variant is not None:
+                total_cost *= BATCH_PRICE_FACTOR
+
             img_bytes = None
             img_mime = "image/png"
             analysis_text = None
+            data_uri = None
             
-            # Walk parts for both image data and text analysis
+            # Single walk over the parts for image data, text analysis and any
+            # base64 data URI that may stand in for a missing inline image
             for candidate in getattr(response, "candidates", []) or []:
                 content = getattr(candidate, "content", None)
                 if not content:
                     continue
                     
-                for i, part in enumerate(content.parts):
+                for part in content.parts or []:
                     # Check for image data
-                    inline_data = getattr(part, "inline_data", None) or getattr(part, "inlineData", None)
+                    inline_data = getattr(part, _INLINE_ATTR, None)
                     if inline_data and getattr(inline_data, "data", None):
-                        img_bytes = bytes(inline_data.data)
-                        img_mime = getattr(inline_data, "mime_type", None) or getattr(inline_data, "mimeType", None) or img_mime
+                        # The SDK already returns bytes; only convert other buffer types
+                        img_bytes = inline_data.data
+                        if not isinstance(img_bytes, bytes):
+                            img_bytes = bytes(img_bytes)
+                        img_mime = getattr(inline_data, _MIME_ATTR, None) or img_mime
+                        # Callers that don't show the analysis need nothing past the image
+                        if not parse_text:
+                            break
                     
                     # Check for text analysis
                     text_content = getattr(part, "text", None)
-                    if text_content and text_content.strip():
-                        # Only capture substantial text (not just whitespace or short responses)
-                        if len(text_content.strip()) > 10:
-                            analysis_text = text_content.strip()
+                    if not text_content:
+                        continue
+                    text_content = text_content.strip()
+                    # Only capture substantial text (not just whitespace or short responses)
+                    if len(text_content) > 10:
+                        analysis_text = text_content
+                    if data_uri is None and text_content.startswith("data:image"):
+                        data_uri = text_content
+                if img_bytes and not parse_text:
+                    break
 
             # Display Nano Banana's analysis if available
             if analysis_text:
                 self._append_chat_log(analysis_text, ai_response=True)
-            else:
+            elif variant is None:
                 self._append_chat_log("Image generated successfully!", ai_response=True)
 
             # ADD AI RESPONSE TO Prompt HISTORY FOR MEMORY
             try:
-                if hasattr(response, 'candidates') and response.candidates:
+                # A new capture may have replaced the history while the request ran
+                stale = history_version is not None and history_version != self._history_version
+                if variant is None and not stale and hasattr(response, 'candidates') and response.candidates:
                     candidate = response.candidates[0]
                     if hasattr(candidate, 'content'):
                         # Add the complete AI response to Prompt history
@@ -1753,27 +2573,15 @@ Anthropic Claude
                 if show_usage:
                     self._append_chat_log(f"Warning: Failed to store response in memory: {e}")
 
-            # Fallback: try to parse base64 from text response if no image found yet
-            if not img_bytes:
-                for candidate in getattr(response, "candidates", []) or []:
-                    content = getattr(candidate, "content", None)
-                    if not content:
-                        continue
-                        
-                    for part in content.parts:
-                        text_content = getattr(part, "text", None)
-                        if text_content:
-                            try:
-                                data = text_content.strip()
-                                if data.startswith("data:image"):
-                                    b64_data = data.split(",", 1)[1]
-                                    img_bytes = base64.b64decode(b64_data)
-                                    break
-                            except Exception:
-                                pass
-                                
-                    if img_bytes:
-                        break
+            # Fallback: decode a base64 data URI from the text if no inline image was found
+            if not img_bytes and data_uri is not None:
+                match = _DATA_URI_RE.match(data_uri)
+                if match:
+                    try:
+                        img_bytes = binascii.a2b_base64(data_uri[match.end():])
+                        img_mime = match.group(1)
+                    except (binascii.Error, ValueError):
+                        pass
 
             if not img_bytes:
                 self._append_chat_log("Error: No image returned by the model.")
@@ -1785,50 +2593,64 @@ Anthropic Claude
                 output_path = output_dir / f"nano_banana_viewport_{timestamp}.png"
             else:
                 output_path = output_dir / f"nano_banana_chat_{timestamp}.png"
-            
-            # Write bytes directly to file
-            with open(output_path, "wb") as f:
-                f.write(img_bytes)
-
-            # Store for later viewing  
-            self._last_generated_image_path = str(output_path)
-            self.show_generated_btn.Enabled = True
-
-            # Update preview thumbnails based on operation type
-            try:
-                sys_bitmap = SD.Bitmap(str(output_path))
-                ms = System.IO.MemoryStream()
-                sys_bitmap.Save(ms, Imaging.ImageFormat.Png)
-                ms.Position = 0
-                eto_bitmap = Drawing.Bitmap(ms)
-                
-                if is_viewport_processing:
-                    # Show processed viewport result in Primary Reference panel
-                    self.viewport_preview.Image = eto_bitmap
-                    # Also update the internal reference data for iterations
-                    self._last_viewport_bitmap = sys_bitmap
-                    self._captured_viewport_bytes = img_bytes
-                else:
-                    # Show generation result in Generated Result panel
-                    self.result_preview.Image = eto_bitmap
-                    
-            except Exception:
+            if variant is not None:
+                output_path = output_path.with_name(f"{output_path.stem}_v{variant}.png")
+                self._append_chat_log(f"Variant {variant} saved to {output_path}", ai_response=True)
+            
+            # Write the file in the background; the previews below use img_bytes
+            writer = threading.Thread(target=self._write_output_file, args=(output_path, img_bytes))
+            writer.start()
+
+            # Store for later viewing; other batch variants are only saved
+            if show_result:
+                self._output_writer = writer
+                self._last_generated_image_path = str(output_path)
+                self._last_generated_path_obj = output_path
+                self._last_generated_bytes = img_bytes
+                self.show_generated_btn.Enabled = True
+
+                # Update preview thumbnails based on operation type
+                # The viewer decodes the full-size image on demand
+                self._last_eto_bitmap = None
                 try:
-                    with open(output_path, 'rb') as f:
-                        img_bytes_reload = f.read()
-                    byte_stream = System.IO.MemoryStream(img_bytes_reload)
-                    eto_bitmap = Drawing.Bitmap(byte_stream)
-                    
+                    # Decode the returned bytes directly instead of reloading the saved file
+                    sys_bitmap = SD.Bitmap(MemoryStream(img_bytes, False))
+                
                     if is_viewport_processing:
-                        self.viewport_preview.Image = eto_bitmap
-                        self._captured_viewport_bytes = img_bytes_reload
+                        # Show processed viewport result in Primary Reference panel
+                        self.viewport_preview.Image = self._make_thumbnail(sys_bitmap, self.viewport_preview)
+                        # Also update the internal reference data for iterations
+                        self._last_viewport_bitmap = sys_bitmap
+                        self._captured_viewport_bytes = img_bytes
+                        self._captured_viewport_mime = img_mime
                     else:
-                        self.result_preview.Image = eto_bitmap
+                        # Show generation result in Generated Result panel, downscaled to the panel
+                        try:
+                            self.result_preview.Image = self._make_thumbnail(sys_bitmap, self.result_preview)
+                            self._result_preview_src = img_bytes
+                        finally:
+                            sys_bitmap.Dispose()
+                    
                 except Exception:
-                    if is_viewport_processing:
-                        self.viewport_preview.Image = None
-                    else:
-                        self.result_preview.Image = None
+                    try:
+                        self._wait_for_output_file()
+                        with open(output_path, 'rb') as f:
+                            img_bytes_reload = f.read()
+                        byte_stream = MemoryStream(img_bytes_reload)
+                        eto_bitmap = Drawing.Bitmap(byte_stream)
+                    
+                        if is_viewport_processing:
+                            self.viewport_preview.Image = eto_bitmap
+                            self._captured_viewport_bytes = img_bytes_reload
+                            self._captured_viewport_mime = img_mime
+                        else:
+                            self.result_preview.Image = eto_bitmap
+                            self._result_preview_src = img_bytes
+                    except Exception:
+                        if is_viewport_processing:
+                            self.viewport_preview.Image = None
+                        else:
+                            self.result_preview.Image = None
             
             # Save usage info to settings for cumulative tracking
             if usage_info and total_tokens > 0:
@@ -1836,6 +2658,8 @@ Anthropic Claude
             elif 'total_cost' in locals():
                 # Track cost even without detailed token usage
                 self._track_cumulative_usage(0, total_cost, show_session_cost=show_usage)
+
+            return output_path
             
         except Exception as e:
             self._append_chat_log(f"Failed to process response: {e}")